@@ -9,6 +9,10 @@ import spawn
 from spawn import ui, status, approval, agents, policy, notify
 
 
+# Max plan steps running at once
+MAX_CONCURRENT_STEPS = 4
+
+
 async def main():
     # 1. Initialize Spawn with your token (from the app)
     spawn.init(token="spwn_sk_your_token_here")
@@ -48,14 +52,46 @@ async def main():
             ]
         )
         
-        # Execute with Spawn-aware actions
-        for step in plan.steps:
-            await execute_step_safely(step)
+        # Execute with Spawn-aware actions, running independent steps together
+        limit = asyncio.Semaphore(MAX_CONCURRENT_STEPS)
+        
+        async def run_step(step):
+            async with limit:
+                await execute_step_safely(step)
+                
+        for layer in plan_layers(plan.steps):
+            await asyncio.gather(*(run_step(step) for step in layer))
             
         await status.set("idle")
         await ui.send_text("✓ Task complete!")
         
         
+def plan_layers(steps):
+    """Group plan steps into layers that can run concurrently.
+    
+    A step may list the steps it needs in `step.depends_on` (which must come
+    earlier in the plan). Steps without it depend on the previous step, so
+    plans that don't declare dependencies still run in order.
+    """
+    layers = []
+    depth = {}
+    prev = None
+    
+    for step in steps:
+        deps = getattr(step, "depends_on", None)
+        if deps is None:
+            deps = [prev] if prev is not None else []
+            
+        level = max((depth[id(d)] + 1 for d in deps), default=0)
+        depth[id(step)] = level
+        if level == len(layers):
+            layers.append([])
+        layers[level].append(step)
+        prev = step
+        
+    return layers
+    
+    
 async def execute_step_safely(step):
     """Execute a step with Spawn safety checks."""
     
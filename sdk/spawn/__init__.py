@@ -3,61 +3,222 @@
 
 from __future__ import annotations
 import asyncio
+import functools
+import itertools
 import json
+import logging
 import os
 import re
-import uuid
-from dataclasses import dataclass, field
+import secrets
+import string
+import sys
+from collections import deque
+from dataclasses import dataclass, field, fields, replace
 from enum import Enum
-from typing import Any, Callable, Dict, List, Optional, Union
-from datetime import datetime, timedelta
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional, Tuple, Union
+from time import monotonic, time as _now
+from types import MappingProxyType
 import websockets
 from websockets.client import WebSocketClientProtocol
 
+try:
+    import orjson  # Optional: faster JSON encoding
+except ImportError:
+    orjson = None
+
+
+def _json_default(obj: Any) -> Any:
+    """Serialize values the JSON encoder doesn't handle natively."""
+    if isinstance(obj, Enum):
+        return obj.value
+    # orjson rejects float/int subclasses that json accepts (e.g. numpy.float64)
+    if isinstance(obj, float):
+        return float(obj)
+    if isinstance(obj, int):
+        return int(obj)
+    # datetime is never imported here: if the caller hasn't loaded it,
+    # obj can't be a datetime
+    dt = sys.modules.get("datetime")
+    if dt is not None and isinstance(obj, dt.datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# _dumps returns bytes (for binary frames), _dumps_text returns str (text frames)
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_json_default, option=_ORJSON_OPTS)
+    
+    def _dumps_text(obj: Any) -> str:
+        return _dumps(obj).decode()
+    _loads = orjson.loads
+else:
+    def _dumps_text(obj: Any) -> str:
+        return json.dumps(obj, default=_json_default)
+    
+    def _dumps(obj: Any) -> bytes:
+        return _dumps_text(obj).encode()
+    _loads = json.loads
+
 
 # ============================================================================
 # Configuration
 # ============================================================================
 
-@dataclass
+# dataclass(slots=True) needs Python 3.10+
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(frozen=True, **_SLOTS)
 class PolicyConfig:
-    """User's safety settings from the Spawn app."""
+    """User's safety settings from the Spawn app.
+    
+    Instances are immutable (list settings are stored as tuples); policy
+    updates replace the whole config.
+    """
     auto_spawn_mode: str = "off"  # off, queue, constrained, trusted, unrestricted
     max_concurrent_sub_agents: int = 5
     max_sub_agents_per_hour: int = 10
     max_tokens_per_sub_agent: int = 50000
     
-    permissions_allowed: List[str] = field(default_factory=lambda: ["files.read", "agent.message"])
-    permissions_forbidden: List[str] = field(default_factory=lambda: ["system.shell", "files.delete", "agent.spawn"])
-    permissions_ask: List[str] = field(default_factory=lambda: ["files.write", "process.execute", "network.fetch"])
+    permissions_allowed: Tuple[str, ...] = ("files.read", "agent.message")
+    permissions_forbidden: Tuple[str, ...] = ("system.shell", "files.delete", "agent.spawn")
+    permissions_ask: Tuple[str, ...] = ("files.write", "process.execute", "network.fetch")
     
-    allowed_paths: List[str] = field(default_factory=list)
-    forbidden_paths: List[str] = field(default_factory=lambda: [
+    allowed_paths: Tuple[str, ...] = ()
+    forbidden_paths: Tuple[str, ...] = (
         "~/.ssh/**", "~/.aws/**", "~/.config/gcloud/**",
         "**/.env", "**/*.pem", "**/*.key", "**/secrets/**"
-    ])
+    )
     
-    allowed_commands: List[str] = field(default_factory=list)
-    allowed_network_domains: List[str] = field(default_factory=list)
+    allowed_commands: Tuple[str, ...] = ()
+    allowed_network_domains: Tuple[str, ...] = ()
     
     check_in_hours: int = 4
+    
+    def __post_init__(self):
+        # Frozen, so normalize through object.__setattr__
+        set_ = object.__setattr__
+        for name, kind in _POLICY_FIELDS.items():
+            if kind is tuple:
+                set_(self, name, tuple(getattr(self, name)))  # Lists from the server
+        set_(self, "auto_spawn_mode", sys.intern(self.auto_spawn_mode))
+
+
+# Policy fields and the type of their defaults
+_POLICY_FIELDS = {f.name: type(f.default) for f in fields(PolicyConfig)}
+
+
+class _CompiledPolicy:
+    """Lookup structures derived from one PolicyConfig."""
+    __slots__ = (
+        "allowed_union", "forbidden_union",
+        "permissions_allowed", "permissions_forbidden", "permissions_ask",
+        "allowed_commands", "allowed_network_domains",
+        "check_in_seconds", "auto_approve",
+    )
+    
+    def __init__(self, cfg: PolicyConfig):
+        self.allowed_union = _compile_union([_expand_path(p) for p in cfg.allowed_paths])
+        self.forbidden_union = _compile_union([_expand_path(p) for p in cfg.forbidden_paths])
+        # Interned scopes make set hits an identity compare
+        self.permissions_allowed = frozenset(map(sys.intern, cfg.permissions_allowed))
+        self.permissions_forbidden = frozenset(map(sys.intern, cfg.permissions_forbidden))
+        self.permissions_ask = frozenset(map(sys.intern, cfg.permissions_ask))
+        self.allowed_commands = frozenset(cfg.allowed_commands)
+        self.allowed_network_domains = frozenset(cfg.allowed_network_domains)
+        self.check_in_seconds = cfg.check_in_hours * 3600
+        self.auto_approve = _make_auto_approve(
+            cfg.auto_spawn_mode, self.permissions_forbidden, self.permissions_ask
+        )
+
+
+def _valid_policy_value(kind: type, value: Any) -> bool:
+    """Check a server-sent value against the type of the field's default."""
+    if kind is tuple:
+        return isinstance(value, (list, tuple)) and all(isinstance(v, str) for v in value)
+    if kind is int:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, kind)
 
 
 # ============================================================================
 # Connection
 # ============================================================================
 
+# Max messages coalesced into a single batch frame
+_BATCH_MAX = 64
+
+# Max memoized policy decisions per connection
+_DECISION_CACHE_MAX = 1024
+
+# Max messages held for delivery while disconnected
+_MAX_QUEUED = 1024
+
+_log = logging.getLogger("spawn")
+
+# Payloads past these sizes are encoded/decoded in a worker thread
+_OFFLOAD_BYTES = 64 * 1024
+_OFFLOAD_ITEMS = 1000  # table rows / chart points
+
+
+class SpawnNotConnected(ConnectionError):
+    """Raised when the relay is unreachable and the outbound queue is full."""
+
+
 class SpawnConnection:
     """WebSocket connection to the Spawn relay."""
     
-    def __init__(self, token: str, relay_url: str = "wss://relay.spawn.io/v1/agent"):
+    def __init__(
+        self,
+        token: str,
+        relay_url: str = "wss://relay.spawn.io/v1/agent",
+        batch_messages: bool = False,
+        binary_frames: bool = False,
+        max_inflight: int = 64
+    ):
         self.token = token
         self.relay_url = relay_url
         self.ws: Optional[WebSocketClientProtocol] = None
         self.policy: PolicyConfig = PolicyConfig()
+        self._compiled = _CompiledPolicy(self.policy)  # Rebuilt with each policy update
         self._handlers: Dict[str, Callable] = {}
         self._pending_responses: Dict[str, asyncio.Future] = {}
+        self._deadlines: Dict[str, float] = {}  # request_id -> loop.time() deadline
+        self._sweep_handle: Optional[asyncio.TimerHandle] = None
+        self._max_inflight = max_inflight
+        self._inflight: Optional[asyncio.Semaphore] = None  # Bounds concurrent _request calls
         self._connected = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # Policy decisions, keyed by (check, *args, policy_version)
+        self._decision_cache: Dict[tuple, bool] = {}
+        self._policy_version = 0
+        
+        # Outbound messages are encoded on send() and written by _sender_loop.
+        # With batch_messages, messages queued back-to-back are wrapped in a
+        # single "batch" frame (requires relay support).
+        self.batch_messages = batch_messages
+        self.binary_frames = binary_frames
+        
+        # Binary frames skip the str -> UTF-8 step (the relay must accept them)
+        if binary_frames:
+            self._encode = _dumps
+            self._batch_parts = (b'{"type":"batch","payload":{"messages":[', b",", b"]}}")
+        else:
+            self._encode = _dumps_text
+            self._batch_parts = ('{"type":"batch","payload":{"messages":[', ",", "]}}")
+        # Loop-bound primitives are (re)built in connect() for the running loop
+        self._send_queue: Optional[asyncio.Queue] = None
+        self._sender_task: Optional[asyncio.Task] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._unsent: List = []  # Frames a closed socket didn't take, resent on connect
+        
+        # Message IDs: random per-connection prefix + monotonic counter
+        self._id_prefix = secrets.token_hex(4)
+        self._id_counter = itertools.count()
         
     async def connect(self):
         """Establish connection to relay."""
@@ -65,43 +226,138 @@ class SpawnConnection:
             "Authorization": f"Bearer {self.token}",
             "X-Agent-Version": "1.0.0",
         }
+        # A reconnect must stop the old loops first, or the old sender keeps
+        # taking frames for the dead socket
+        await self._stop_loops()
         self.ws = await websockets.connect(self.relay_url, extra_headers=headers)
         self._connected = True
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._bind_loop(loop)
+        
+        # Start sender and message loop (the policy response arrives via the loop)
+        self._sender_task = asyncio.create_task(self._sender_loop())
+        self._reader_task = asyncio.create_task(self._message_loop())
         
         # Fetch initial policy
         await self._fetch_policy()
         
-        # Start message loop
-        asyncio.create_task(self._message_loop())
+    async def _stop_loops(self):
+        """Cancel the sender and message loops of a previous connect()."""
+        current = asyncio.get_running_loop()
+        for task in (self._sender_task, self._reader_task):
+            # Tasks from an earlier asyncio.run() died with their loop
+            if task is None or task.done() or task.get_loop() is not current:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._sender_task = self._reader_task = None
         
+    def _bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """Rebuild loop-bound state for a new event loop.
+        
+        On Python < 3.10 a Queue/Semaphore binds to the loop current at
+        construction, so ones made before asyncio.run() (or under a previous
+        run) can't be awaited here. Frames queued meanwhile carry over.
+        """
+        self._loop = loop
+        old, self._send_queue = self._send_queue, asyncio.Queue()
+        while old is not None and not old.empty():
+            self._send_queue.put_nowait(old.get_nowait())
+        self._inflight = asyncio.Semaphore(self._max_inflight)
+        self._sweep_handle = None  # A timer on the old loop never fires
+        
+    async def _sender_loop(self):
+        """Write queued messages, coalescing those that are ready together."""
+        queue = self._send_queue
+        ws_send = self.ws.send
+        frames, self._unsent = self._unsent, []
+        while True:
+            if not frames:
+                frames.append(await queue.get())
+            while not queue.empty() and len(frames) < _BATCH_MAX:
+                frames.append(queue.get_nowait())
+                
+            sent = 0
+            try:
+                if self.batch_messages and len(frames) > 1:
+                    head, sep, tail = self._batch_parts
+                    await ws_send(head + sep.join(frames) + tail)
+                    sent = len(frames)
+                else:
+                    for frame in frames:
+                        await ws_send(frame)
+                        sent += 1
+            except asyncio.CancelledError:
+                # Stopped by a reconnect; the new sender writes these first
+                self._unsent = frames[sent:]
+                raise
+            except websockets.ConnectionClosed:
+                # Keep the rest queued; the next connect() drains it
+                self._connected = False
+                self._unsent = frames[sent:]
+                return
+            except Exception:
+                # Don't die silently: mark the connection down so sends
+                # surface SpawnNotConnected once the queue fills up
+                _log.exception("Spawn sender loop failed; marking connection down")
+                self._connected = False
+                self._unsent = frames[sent:]
+                return
+            frames = []
+                
     async def _message_loop(self):
-        """Process incoming messages."""
+        """Process incoming messages until the relay closes the socket."""
+        try:
+            await self._read_messages()
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            # Sends are held (and bounded) from here until the next connect()
+            self._connected = False
+            
+    async def _read_messages(self):
+        """Dispatch each incoming message."""
+        handlers = self._handlers
+        pending = self._pending_responses
+        
         async for message in self.ws:
-            data = json.loads(message)
+            if len(message) < _OFFLOAD_BYTES:
+                data = _loads(message)
+            else:
+                data = await self._loop.run_in_executor(None, _loads, message)
             msg_type = data.get("type")
+            payload = data.get("payload") or {}
             
             # Handle responses to our requests
-            if "request_id" in data.get("payload", {}):
-                req_id = data["payload"]["request_id"]
-                if req_id in self._pending_responses:
-                    self._pending_responses[req_id].set_result(data)
+            req_id = payload.get("request_id")
+            if req_id is not None:
+                future = pending.get(req_id)
+                if future is not None:
+                    if not future.done():
+                        future.set_result(data)
                     continue
             
             # Handle incoming messages
-            if msg_type in self._handlers:
-                await self._handlers[msg_type](data)
+            handler = handlers.get(msg_type)
+            if handler is not None:
+                await handler(data)
             elif msg_type == "policy_update":
-                self._update_policy(data["payload"])
+                self._update_policy(payload)
             elif msg_type == "message":
-                if "on_message" in self._handlers:
-                    await self._handlers["on_message"](data["payload"])
+                handler = handlers.get("on_message")
+                if handler is not None:
+                    await handler(payload)
                     
     async def _fetch_policy(self):
         """Get current policy settings from relay."""
         response = await self._request({
             "type": "get_policy",
-            "id": f"msg_{uuid.uuid4().hex[:12]}",
-            "ts": int(datetime.now().timestamp()),
+            "id": self._new_id("msg"),
+            "ts": int(_now()),
             "payload": {}
         })
         if response:
@@ -109,32 +365,120 @@ class SpawnConnection:
             
     def _update_policy(self, data: Dict):
         """Update local policy from server data."""
+        changes = {}
         for key, value in data.items():
-            if hasattr(self.policy, key):
-                setattr(self.policy, key, value)
+            kind = _POLICY_FIELDS.get(key)
+            if kind is None:
+                continue
+            if _valid_policy_value(kind, value):
+                changes[key] = value
+            else:
+                # Skip just this field; a bad value mustn't stop the message loop
+                _log.warning("Ignoring invalid policy value for %s: %r", key, value)
                 
-    async def _request(self, message: Dict, timeout: float = 30.0) -> Optional[Dict]:
-        """Send a request and wait for response."""
+        # Swap in a new config and its lookups; the version bump
+        # invalidates cached decisions
+        try:
+            policy = replace(self.policy, **changes)
+            compiled = _CompiledPolicy(policy)
+        except Exception:
+            _log.exception("Ignoring policy update that failed to compile")
+            return
+        self.policy = policy
+        self._compiled = compiled
+        self._policy_version += 1
+                
+    async def _request(self, message: Dict, timeout: Optional[float] = 30.0) -> Optional[Dict]:
+        """Send a request and wait for response (timeout=None waits indefinitely)."""
         request_id = message.get("payload", {}).get("request_id") or message.get("id")
-        future = asyncio.get_event_loop().create_future()
-        self._pending_responses[request_id] = future
         
-        await self.ws.send(json.dumps(message))
+        if self._inflight is None:
+            self._inflight = asyncio.Semaphore(self._max_inflight)
+        async with self._inflight:
+            loop = self._loop or asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending_responses[request_id] = future
+            
+            try:
+                if timeout is not None:
+                    self._add_deadline(loop, request_id, loop.time() + timeout)
+                self._enqueue(self._encode(message))
+                return await future  # Resolved with None by _sweep on timeout
+            finally:
+                self._pending_responses.pop(request_id, None)
+                self._deadlines.pop(request_id, None)
+                
+    def _add_deadline(self, loop: asyncio.AbstractEventLoop, request_id: str, deadline: float):
+        """Track a request deadline; one timer covers all pending requests."""
+        self._deadlines[request_id] = deadline
+        handle = self._sweep_handle
+        if handle is None or deadline < handle.when():
+            if handle is not None:
+                handle.cancel()
+            self._sweep_handle = loop.call_at(deadline, self._sweep, loop)
+            
+    def _sweep(self, loop: asyncio.AbstractEventLoop):
+        """Time out expired requests and re-arm the timer for the next deadline."""
+        self._sweep_handle = None
+        now = loop.time()
+        next_deadline = None
+        for request_id, deadline in self._deadlines.items():
+            if deadline <= now:
+                future = self._pending_responses.get(request_id)
+                if future is not None and not future.done():
+                    future.set_result(None)
+            elif next_deadline is None or deadline < next_deadline:
+                next_deadline = deadline
+        if next_deadline is not None:
+            self._sweep_handle = loop.call_at(next_deadline, self._sweep, loop)
+            
+    async def send(self, message: Dict, large: bool = False):
+        """Send a message without waiting for response.
         
-        try:
-            return await asyncio.wait_for(future, timeout)
-        except asyncio.TimeoutError:
-            return None
-        finally:
-            self._pending_responses.pop(request_id, None)
+        The message is encoded before send() returns, so callers may reuse
+        and mutate the dict afterwards. Pass large=True for big payloads to
+        encode them off the event loop.
+        """
+        if large:
+            self._stamp(message)
+            loop = self._loop or asyncio.get_running_loop()
+            self._enqueue(await loop.run_in_executor(None, self._encode, message))
+        else:
+            self.send_batched(message)
             
-    async def send(self, message: Dict):
-        """Send a message without waiting for response."""
+    def send_batched(self, message: Dict):
+        """Queue a message without awaiting.
+        
+        Messages queued in the same event-loop tick are written together by
+        the sender loop (as one "batch" frame when batch_messages is on).
+        """
+        self._stamp(message)
+        self._enqueue(self._encode(message))
+        
+    def _stamp(self, message: Dict):
+        """Fill in the message id and timestamp if the caller didn't."""
         if "id" not in message:
-            message["id"] = f"msg_{uuid.uuid4().hex[:12]}"
+            message["id"] = self._new_id("msg")
         if "ts" not in message:
-            message["ts"] = int(datetime.now().timestamp())
-        await self.ws.send(json.dumps(message))
+            message["ts"] = int(_now())
+        
+    def send_raw(self, frame: str):
+        """Queue an already JSON-encoded message (must include id and ts)."""
+        self._enqueue(frame.encode() if self.binary_frames else frame)
+        
+    def _enqueue(self, frame: Union[str, bytes]):
+        """Queue an encoded frame for the sender loop."""
+        queue = self._send_queue
+        if queue is None:
+            # Sent before connect(); connect() moves these onto its own queue
+            queue = self._send_queue = asyncio.Queue()
+        if not self._connected and queue.qsize() >= _MAX_QUEUED:
+            raise SpawnNotConnected(f"Not connected to relay ({_MAX_QUEUED} messages queued)")
+        queue.put_nowait(frame)
+        
+    def _new_id(self, kind: str) -> str:
+        """Generate a unique message/request ID, e.g. msg_1a2b3c4d00000001."""
+        return f"{kind}_{self._id_prefix}{next(self._id_counter):08x}"
         
     def on(self, event: str, handler: Callable):
         """Register an event handler."""
@@ -145,13 +489,25 @@ class SpawnConnection:
 _connection: Optional[SpawnConnection] = None
 
 
-def init(token: str = None, relay_url: str = None):
+def init(
+    token: str = None,
+    relay_url: str = None,
+    batch_messages: bool = False,
+    binary_frames: bool = False,
+    max_inflight: int = 64
+):
     """Initialize the Spawn SDK."""
     global _connection
     token = token or os.environ.get("SPAWN_TOKEN")
     if not token:
         raise ValueError("SPAWN_TOKEN required")
-    _connection = SpawnConnection(token, relay_url or "wss://relay.spawn.io/v1/agent")
+    _connection = SpawnConnection(
+        token,
+        relay_url or "wss://relay.spawn.io/v1/agent",
+        batch_messages=batch_messages,
+        binary_frames=binary_frames,
+        max_inflight=max_inflight
+    )
     return _connection
 
 
@@ -161,9 +517,29 @@ async def connect():
         await _connection.connect()
         
 
+# Defaults used before init(), built once rather than on every get_policy()
+_default_policy: Optional[PolicyConfig] = None
+_default_compiled: Optional[_CompiledPolicy] = None
+
+
 def get_policy() -> PolicyConfig:
     """Get current policy settings."""
-    return _connection.policy if _connection else PolicyConfig()
+    global _default_policy
+    if _connection:
+        return _connection.policy
+    if _default_policy is None:
+        _default_policy = PolicyConfig()
+    return _default_policy
+
+
+def _compiled_policy() -> _CompiledPolicy:
+    """Get the lookup structures for the current policy."""
+    global _default_compiled
+    if _connection:
+        return _connection._compiled
+    if _default_compiled is None:
+        _default_compiled = _CompiledPolicy(get_policy())
+    return _default_compiled
 
 
 # ============================================================================
@@ -234,7 +610,7 @@ class ui:
                 "rows": rows,
                 "actions": actions or []
             }
-        })
+        }, large=len(rows) >= _OFFLOAD_ITEMS)
         
     @staticmethod
     async def send_chart(
@@ -256,7 +632,7 @@ class ui:
                 "y_axis": y_axis,
                 "size": size
             }
-        })
+        }, large=sum(len(s.get("values") or ()) for s in series) >= _OFFLOAD_ITEMS)
         
     @staticmethod
     async def send_error(
@@ -291,6 +667,14 @@ class status:
     _current: str = "idle"
     _label: str = None
     
+    # Reused for every update
+    _message: Dict = {
+        "type": "status_update",
+        "id": None,
+        "ts": None,
+        "payload": {"status": None, "label": None}
+    }
+    
     @classmethod
     async def set(cls, state: str, label: str = None):
         """Update agent status.
@@ -300,13 +684,12 @@ class status:
         cls._current = state
         cls._label = label
         
-        await _connection.send({
-            "type": "status_update",
-            "payload": {
-                "status": state,
-                "label": label
-            }
-        })
+        message = cls._message
+        message["id"] = _connection._new_id("msg")
+        message["ts"] = int(_now())
+        message["payload"]["status"] = state
+        message["payload"]["label"] = label
+        await _connection.send(message)
         
     @classmethod
     def get(cls) -> str:
@@ -317,7 +700,7 @@ class status:
 # Progress Module
 # ============================================================================
 
-@dataclass
+@dataclass(**_SLOTS)
 class ProgressHandle:
     """Handle for updating a progress indicator."""
     id: str
@@ -325,6 +708,19 @@ class ProgressHandle:
     steps: List[str] = None
     total: int = None
     _current: int = 0
+    _message: Dict = field(default=None, init=False, repr=False)
+    _step_states: List[str] = field(default=None, init=False, repr=False)
+    _step: int = field(default=0, init=False, repr=False)
+    
+    def __post_init__(self):
+        self._step_states = ["pending"] * len(self.steps) if self.steps else []
+        # Reused for every update
+        self._message = {
+            "type": "progress",
+            "id": None,
+            "ts": None,
+            "payload": {"request_id": self.id, "status": "running"}
+        }
     
     async def update(
         self,
@@ -338,33 +734,54 @@ class ProgressHandle:
         if current is not None:
             self._current = current
             
-        payload = {"request_id": self.id}
+        payload = self._message["payload"]
         
         if progress is not None:
             payload["progress"] = progress
         elif self.total and current is not None:
             payload["progress"] = current / self.total
+        else:
+            payload.pop("progress", None)
             
         if message:
             payload["message"] = message
+        else:
+            payload.pop("message", None)
             
         if step is not None and self.steps:
+            states = self._step_states
+            last = self._step
+            count = len(states)
+            if 0 <= step < count and 0 <= last < count:
+                # Only touch the states between the previous and the new step
+                if step >= last:
+                    states[last:step] = ["complete"] * (step - last)
+                else:
+                    states[step + 1:last + 1] = ["pending"] * (last - step)
+                states[step] = step_status or "running"
+            else:
+                # Out of range (e.g. step=len(steps) marks every step complete):
+                # rebuild in full; an invalid step_status index raises before
+                # any state changes
+                rebuilt = [
+                    "complete" if i < step else ("running" if i == step else "pending")
+                    for i in range(count)
+                ]
+                if step_status:
+                    rebuilt[step] = step_status
+                states[:] = rebuilt
+            self._step = step
+            
             payload["steps"] = [
-                {
-                    "label": s,
-                    "status": "complete" if i < step else ("running" if i == step else "pending")
-                }
-                for i, s in enumerate(self.steps)
+                {"label": label, "status": state}
+                for label, state in zip(self.steps, states)
             ]
-            if step_status:
-                payload["steps"][step]["status"] = step_status
-                
-        payload["status"] = "running"
+        else:
+            payload.pop("steps", None)
         
-        await _connection.send({
-            "type": "progress",
-            "payload": payload
-        })
+        self._message["id"] = _connection._new_id("msg")
+        self._message["ts"] = int(_now())
+        await _connection.send(self._message)
         
     async def complete(self, message: str = None):
         """Mark progress as complete."""
@@ -402,7 +819,7 @@ class progress:
     ) -> ProgressHandle:
         """Start a new progress indicator."""
         handle = ProgressHandle(
-            id=f"prg_{uuid.uuid4().hex[:12]}",
+            id=_connection._new_id("prg"),
             title=title,
             steps=steps,
             total=total
@@ -431,6 +848,16 @@ class progress:
 # Approval Module
 # ============================================================================
 
+# Detail rows for approval.confirm_trade, formatted against a per-call context
+_TRADE_FMT = (
+    ("Action", "{action}"),
+    ("Symbol", "{symbol}"),
+    ("Quantity", "{quantity}"),
+    ("Price", "${price:,.2f}"),
+    ("Total", "${total:,.2f}"),
+)
+
+
 class approval:
     """Request user approval for sensitive actions."""
     
@@ -446,7 +873,7 @@ class approval:
         
         danger_level: low, medium, high, critical
         """
-        request_id = f"cfm_{uuid.uuid4().hex[:12]}"
+        request_id = _connection._new_id("cfm")
         
         payload = {
             "request_id": request_id,
@@ -472,8 +899,8 @@ class approval:
             
         response = await _connection._request({
             "type": "confirmation_request",
-            "id": f"msg_{uuid.uuid4().hex[:12]}",
-            "ts": int(datetime.now().timestamp()),
+            "id": _connection._new_id("msg"),
+            "ts": int(_now()),
             "payload": payload
         }, timeout=timeout_seconds)
         
@@ -492,20 +919,19 @@ class approval:
         timeout_seconds: int = 300
     ) -> bool:
         """Request confirmation for a trade."""
-        total = quantity * price
-        
-        details = [
-            {"label": "Action", "value": action},
-            {"label": "Symbol", "value": symbol},
-            {"label": "Quantity", "value": str(quantity)},
-            {"label": "Price", "value": f"${price:,.2f}"},
-            {"label": "Total", "value": f"${total:,.2f}"},
-        ]
+        ctx = {
+            "action": action,
+            "symbol": symbol,
+            "quantity": quantity,
+            "price": price,
+            "total": quantity * price,
+        }
+        details = [{"label": label, "value": fmt.format_map(ctx)} for label, fmt in _TRADE_FMT]
         
         if stop_loss:
-            details.append({"label": "Stop Loss", "value": f"${stop_loss:,.2f}"})
+            details += ({"label": "Stop Loss", "value": f"${stop_loss:,.2f}"},)
         if take_profit:
-            details.append({"label": "Take Profit", "value": f"${take_profit:,.2f}"})
+            details += ({"label": "Take Profit", "value": f"${take_profit:,.2f}"},)
             
         return await approval.confirm(
             title=f"{action} {quantity} {symbol}?",
@@ -527,12 +953,12 @@ class approval:
         
         Returns the selected option ID, or None if cancelled/timeout.
         """
-        request_id = f"cfm_{uuid.uuid4().hex[:12]}"
+        request_id = _connection._new_id("cfm")
         
         response = await _connection._request({
             "type": "confirmation_request",
-            "id": f"msg_{uuid.uuid4().hex[:12]}",
-            "ts": int(datetime.now().timestamp()),
+            "id": _connection._new_id("msg"),
+            "ts": int(_now()),
             "payload": {
                 "request_id": request_id,
                 "title": title,
@@ -552,93 +978,155 @@ class approval:
 # Policy Module
 # ============================================================================
 
+def _policy_is_allowed(permission: str, target: str = None) -> bool:
+    """Check if a permission is allowed without asking."""
+    return _cached_decision("allowed", _is_allowed, permission, target)
+
+
+def _policy_is_forbidden(permission: str) -> bool:
+    """Check if a permission is explicitly forbidden."""
+    return permission in _compiled_policy().permissions_forbidden
+
+
+def _policy_requires_approval(permission: str) -> bool:
+    """Check if a permission requires user approval."""
+    return permission in _compiled_policy().permissions_ask
+
+
+def _policy_is_path_allowed(path: str) -> bool:
+    """Check if a path is in the allowed list."""
+    return _cached_decision("path_allowed", _is_path_allowed, path)
+
+
+def _policy_is_path_forbidden(path: str) -> bool:
+    """Check if a path is in the forbidden list."""
+    return _cached_decision("path_forbidden", _is_path_forbidden, path)
+
+
+def _policy_is_command_allowed(command: str) -> bool:
+    """Check if a command is in the allowed list."""
+    cmd_name = command.split()[0] if command else ""
+    return cmd_name in _compiled_policy().allowed_commands
+
+
+def _policy_is_domain_allowed(domain: str) -> bool:
+    """Check if a network domain is allowed."""
+    return domain in _compiled_policy().allowed_network_domains
+
+
 class policy:
     """Check user's safety policies."""
     
-    @staticmethod
-    def is_allowed(permission: str, target: str = None) -> bool:
-        """Check if a permission is allowed without asking."""
-        cfg = get_policy()
-        
-        # Check if explicitly forbidden
-        if permission in cfg.permissions_forbidden:
-            return False
-            
-        # Check if explicitly allowed
-        if permission in cfg.permissions_allowed:
-            # Still need to check path for file permissions
-            if permission.startswith("files.") and target:
-                return policy.is_path_allowed(target) and not policy.is_path_forbidden(target)
-            return True
-            
-        return False
-    
-    @staticmethod
-    def is_forbidden(permission: str) -> bool:
-        """Check if a permission is explicitly forbidden."""
-        cfg = get_policy()
-        return permission in cfg.permissions_forbidden
-    
-    @staticmethod
-    def requires_approval(permission: str) -> bool:
-        """Check if a permission requires user approval."""
-        cfg = get_policy()
-        return permission in cfg.permissions_ask
+    is_allowed = staticmethod(_policy_is_allowed)
+    is_forbidden = staticmethod(_policy_is_forbidden)
+    requires_approval = staticmethod(_policy_requires_approval)
+    is_path_allowed = staticmethod(_policy_is_path_allowed)
+    is_path_forbidden = staticmethod(_policy_is_path_forbidden)
+    is_command_allowed = staticmethod(_policy_is_command_allowed)
+    is_domain_allowed = staticmethod(_policy_is_domain_allowed)
+
+
+def _cached_decision(check: str, fn: Callable[..., bool], *args) -> bool:
+    """Memoize a policy decision until the next policy update."""
+    conn = _connection
+    if conn is None:
+        return fn(*args)
     
-    @staticmethod
-    def is_path_allowed(path: str) -> bool:
-        """Check if a path is in the allowed list."""
-        cfg = get_policy()
-        path = os.path.expanduser(path)
-        
-        for pattern in cfg.allowed_paths:
-            pattern = os.path.expanduser(pattern)
-            if _match_glob(path, pattern):
-                return True
-        return False
+    key = (check, *args, conn._policy_version)
+    cache = conn._decision_cache
+    result = cache.get(key)
+    if result is None:
+        result = fn(*args)
+        if len(cache) >= _DECISION_CACHE_MAX:
+            # FIFO eviction; entries from older policy versions age out first
+            del cache[next(iter(cache))]
+        cache[key] = result
+    return result
+
+
+def _is_allowed(permission: str, target: Optional[str]) -> bool:
+    compiled = _compiled_policy()
     
-    @staticmethod
-    def is_path_forbidden(path: str) -> bool:
-        """Check if a path is in the forbidden list."""
-        cfg = get_policy()
-        path = os.path.expanduser(path)
-        
-        for pattern in cfg.forbidden_paths:
-            pattern = os.path.expanduser(pattern)
-            if _match_glob(path, pattern):
-                return True
+    # Check if explicitly forbidden
+    if permission in compiled.permissions_forbidden:
         return False
-    
-    @staticmethod
-    def is_command_allowed(command: str) -> bool:
-        """Check if a command is in the allowed list."""
-        cfg = get_policy()
-        cmd_name = command.split()[0] if command else ""
-        return cmd_name in cfg.allowed_commands
-    
-    @staticmethod
-    def is_domain_allowed(domain: str) -> bool:
-        """Check if a network domain is allowed."""
-        cfg = get_policy()
-        return domain in cfg.allowed_network_domains
+        
+    # Check if explicitly allowed
+    if permission in compiled.permissions_allowed:
+        # Still need to check path for file permissions
+        if permission.startswith("files.") and target:
+            return _is_path_allowed(target) and not _is_path_forbidden(target)
+        return True
+        
+    return False
+
+
+def _is_path_allowed(path: str) -> bool:
+    union = _compiled_policy().allowed_union
+    return union is not None and union.fullmatch(_expand_path(path)) is not None
+
+
+def _is_path_forbidden(path: str) -> bool:
+    union = _compiled_policy().forbidden_union
+    return union is not None and union.fullmatch(_expand_path(path)) is not None
+
+
+_GLOB_TOKENS = {
+    "**/": r"(?:.*/)?",  # zero or more directories
+    "**": r".*",         # anything, including /
+    "*": r"[^/]*",       # anything within one path segment
+    "?": r"[^/]",        # one character within a path segment
+}
+# Wildcards, plus [...] / [!...] character classes (a "]" right after the
+# opening bracket is a literal member, as in fnmatch)
+_GLOB_TOKEN_RE = re.compile(r"\*\*/|\*\*|\*|\?|\[(?:!?\][^\]]*|![^\]]+|[^!\]][^\]]*)\]")
+
+
+def _glob_class(token: str) -> str:
+    """Translate a glob character class like [!a-z] to its regex form."""
+    body = re.sub(r"([\\&~|\[])", r"\\\1", token[1:-1])
+    if body.startswith("!"):
+        body = "^" + body[1:]
+    elif body.startswith("^"):
+        body = "\\" + body
+    try:
+        re.compile(f"[{body}]")
+    except re.error:
+        return "(?!)"  # e.g. a reversed range like [z-a] matches nothing
+    return f"[{body}]"
 
 
-def _match_glob(path: str, pattern: str) -> bool:
-    """Simple glob matching for paths."""
-    # Convert glob to regex
-    regex = pattern.replace(".", r"\.")
-    regex = regex.replace("**", "<<<DOUBLESTAR>>>")
-    regex = regex.replace("*", r"[^/]*")
-    regex = regex.replace("<<<DOUBLESTAR>>>", r".*")
-    regex = f"^{regex}$"
-    return bool(re.match(regex, path))
+def _glob_to_regex(pattern: str) -> str:
+    """Convert a path glob to an (unanchored) regex."""
+    parts = []
+    pos = 0
+    for m in _GLOB_TOKEN_RE.finditer(pattern):
+        token = m.group()
+        parts.append(re.escape(pattern[pos:m.start()]))
+        parts.append(_glob_class(token) if token[0] == "[" else _GLOB_TOKENS[token])
+        pos = m.end()
+    parts.append(re.escape(pattern[pos:]))
+    return "".join(parts)
+
+
+def _compile_union(patterns: List[str]) -> Optional[re.Pattern]:
+    """Compile several path globs into a single alternation regex (use fullmatch)."""
+    if not patterns:
+        return None
+    return re.compile("|".join(_glob_to_regex(p) for p in patterns))
+
+
+@functools.lru_cache(maxsize=1024)
+def _expand_path(path: str) -> str:
+    """Expand ~ in a path (cached, since it hits env/pwd lookups)."""
+    return os.path.expanduser(path)
 
 
 # ============================================================================
 # Agents Module
 # ============================================================================
 
-@dataclass
+@dataclass(**_SLOTS)
 class SubAgent:
     """Handle for a spawned sub-agent."""
     id: str
@@ -646,17 +1134,21 @@ class SubAgent:
     role: str
     status: str = "online"
     
+    # Pre-rendered frames; only id, ts and the JSON-encoded values vary
+    _TASK_FRAME = (
+        '{"type":"internal_command","id":"%s","ts":%d,'
+        '"payload":{"from":"parent","to":%s,"command":"task","data":{"task":%s}}}'
+    )
+    _TERMINATE_FRAME = (
+        '{"type":"sub_agent_terminate","id":"%s","ts":%d,'
+        '"payload":{"sub_agent_id":%s,"reason":%s,"notify_user":true}}'
+    )
+    
     async def send_task(self, task: str):
         """Send a task to this sub-agent."""
-        await _connection.send({
-            "type": "internal_command",
-            "payload": {
-                "from": "parent",
-                "to": self.id,
-                "command": "task",
-                "data": {"task": task}
-            }
-        })
+        _connection.send_raw(self._TASK_FRAME % (
+            _connection._new_id("msg"), _now(), _dumps_text(self.id), _dumps_text(task)
+        ))
         
     async def wait_for_result(self, timeout: float = 300) -> Any:
         """Wait for sub-agent to complete and return result."""
@@ -665,240 +1157,310 @@ class SubAgent:
     
     async def terminate(self, reason: str = "Task complete"):
         """Terminate this sub-agent."""
-        await _connection.send({
-            "type": "sub_agent_terminate",
-            "payload": {
-                "sub_agent_id": self.id,
-                "reason": reason,
-                "notify_user": True
-            }
-        })
+        _connection.send_raw(self._TERMINATE_FRAME % (
+            _connection._new_id("msg"), _now(), _dumps_text(self.id), _dumps_text(reason)
+        ))
+        _agents.active.pop(self.id, None)
 
 
-class agents:
-    """Sub-agent management."""
+# Lowercases ASCII and turns spaces into underscores in one str.translate pass
+_SLUG_TABLE = str.maketrans({" ": "_", **{c: c.lower() for c in string.ascii_uppercase}})
+
+
+def _make_sub_id(name: str) -> str:
+    """Build a sub-agent ID like sub_test_runner_1a2b3c."""
+    return f"sub_{name.translate(_SLUG_TABLE)}_{secrets.token_hex(3)}"
+
+
+class _AgentsState:
+    """Mutable state behind the agents namespace."""
+    __slots__ = ("active", "spawn_times", "paused")
     
-    _active: List[SubAgent] = []
-    _spawned_this_hour: int = 0
+    def __init__(self):
+        self.active: Dict[str, SubAgent] = {}  # sub_agent_id -> SubAgent
+        self.spawn_times: Deque[float] = deque()  # monotonic() of each spawn, oldest first
+        self.paused = False
+
+
+_agents = _AgentsState()
+
+
+def _agents_can_spawn() -> bool:
+    """Check if we can spawn another sub-agent."""
+    cfg = get_policy()
     
-    @classmethod
-    def can_spawn(cls) -> bool:
-        """Check if we can spawn another sub-agent."""
-        cfg = get_policy()
+    if cfg.auto_spawn_mode == "off":
+        return True  # Can request, just needs approval
         
-        if cfg.auto_spawn_mode == "off":
-            return True  # Can request, just needs approval
-            
-        if len(cls._active) >= cfg.max_concurrent_sub_agents:
-            return False
-            
-        if cls._spawned_this_hour >= cfg.max_sub_agents_per_hour:
-            return False
-            
-        return True
-    
-    @classmethod
-    def active_count(cls) -> int:
-        """Get count of active sub-agents."""
-        return len(cls._active)
-    
-    @classmethod
-    def max_concurrent(cls) -> int:
-        """Get max allowed concurrent sub-agents."""
-        return get_policy().max_concurrent_sub_agents
-    
-    @classmethod
-    def active(cls) -> List[SubAgent]:
-        """Get list of active sub-agents."""
-        return cls._active.copy()
-    
-    @classmethod
-    def would_auto_approve(cls, permissions: List[Dict]) -> bool:
-        """Check if a spawn request would be auto-approved."""
-        cfg = get_policy()
+    if len(_agents.active) >= cfg.max_concurrent_sub_agents:
+        return False
         
-        if cfg.auto_spawn_mode in ("off", "queue"):
-            return False
-            
-        if cfg.auto_spawn_mode == "unrestricted":
-            return True
-            
-        # Check each requested permission
-        for perm in permissions:
-            scope = perm.get("scope", "")
-            
-            # Forbidden permissions never auto-approve
-            if scope in cfg.permissions_forbidden:
-                return False
-                
-            # Must-ask permissions don't auto-approve in constrained mode
-            if cfg.auto_spawn_mode == "constrained" and scope in cfg.permissions_ask:
-                return False
-                
-        return True
-    
-    @classmethod
-    async def request_spawn(
-        cls,
-        name: str,
-        role: str = None,
-        description: str = None,
-        permissions: List[Dict] = None,
-        lifespan: str = "task_bound",
-        reason: str = None,
-        icon: str = None
-    ) -> Optional[SubAgent]:
-        """Request to spawn a sub-agent (may require approval)."""
-        
-        request_id = f"spawn_req_{uuid.uuid4().hex[:12]}"
-        sub_agent_id = f"sub_{name.lower().replace(' ', '_')}_{uuid.uuid4().hex[:6]}"
+    # Drop spawns older than an hour, then check the hourly cap
+    spawn_times = _agents.spawn_times
+    cutoff = monotonic() - 3600
+    while spawn_times and spawn_times[0] < cutoff:
+        spawn_times.popleft()
+    if len(spawn_times) >= cfg.max_sub_agents_per_hour:
+        return False
         
-        response = await _connection._request({
-            "type": "agent_spawn_request",
-            "id": f"msg_{uuid.uuid4().hex[:12]}",
-            "ts": int(datetime.now().timestamp()),
-            "payload": {
-                "request_id": request_id,
-                "proposed_agent": {
-                    "id": sub_agent_id,
-                    "name": name,
-                    "role": role,
-                    "description": description,
-                    "icon": icon,
-                    "permissions": permissions or [],
-                    "lifespan": lifespan,
-                },
-                "reason": reason
-            }
-        }, timeout=600)  # 10 min timeout for approval
-        
-        if response and response.get("payload", {}).get("decision") == "approved":
-            sub = SubAgent(
-                id=sub_agent_id,
-                name=name,
-                role=role or "Sub-Agent"
-            )
-            cls._active.append(sub)
-            cls._spawned_this_hour += 1
-            return sub
-            
-        return None
+    return True
+
+
+def _agents_active_count() -> int:
+    """Get count of active sub-agents."""
+    return len(_agents.active)
+
+
+def _agents_max_concurrent() -> int:
+    """Get max allowed concurrent sub-agents."""
+    return get_policy().max_concurrent_sub_agents
+
+
+def _agents_active() -> Tuple[SubAgent, ...]:
+    """Get a snapshot of active sub-agents."""
+    return tuple(_agents.active.values())
+
+
+def _agents_active_view() -> Mapping[str, SubAgent]:
+    """Get a live read-only view of active sub-agents, keyed by id."""
+    return MappingProxyType(_agents.active)
+
+
+def _make_auto_approve(
+    mode: str, forbidden: frozenset, ask: frozenset
+) -> Callable[[List[Dict]], bool]:
+    """Build the auto-approval check for one spawn mode and its permission sets."""
+    if mode in ("off", "queue"):
+        return lambda permissions: False
+        
+    if mode == "unrestricted":
+        return lambda permissions: True
+        
+    if mode == "constrained":
+        # Must-ask permissions don't auto-approve in constrained mode
+        blocked = forbidden | ask
+    else:
+        # Forbidden permissions never auto-approve
+        blocked = forbidden
+        
+    def check(permissions: List[Dict]) -> bool:
+        return blocked.isdisjoint([perm.get("scope", "") for perm in permissions])
+    return check
+
+
+def _agents_would_auto_approve(permissions: List[Dict]) -> bool:
+    """Check if a spawn request would be auto-approved."""
+    return _compiled_policy().auto_approve(permissions)
+
+
+async def _agents_request_spawn(
+    name: str,
+    role: str = None,
+    description: str = None,
+    permissions: List[Dict] = None,
+    lifespan: str = "task_bound",
+    reason: str = None,
+    icon: str = None
+) -> Optional[SubAgent]:
+    """Request to spawn a sub-agent (may require approval).
     
-    @classmethod
-    async def spawn(
-        cls,
-        name: str,
-        role: str = None,
-        permissions: List[Dict] = None,
-        lifespan: str = "task_bound",
-        notify: bool = True
-    ) -> SubAgent:
-        """Spawn a sub-agent directly (only works if would_auto_approve)."""
-        
-        if not cls.would_auto_approve(permissions or []):
-            raise PermissionError("Cannot auto-spawn with these permissions")
-            
-        sub_agent_id = f"sub_{name.lower().replace(' ', '_')}_{uuid.uuid4().hex[:6]}"
+    If the policy would auto-approve these permissions (and spawn limits
+    allow it), the sub-agent is spawned directly without asking.
+    """
+    
+    if _agents_can_spawn() and _agents_would_auto_approve(permissions or []):
+        return await _agents_spawn(
+            name=name,
+            role=role,
+            permissions=permissions,
+            lifespan=lifespan,
+            notify=True
+        )
         
-        await _connection.send({
-            "type": "sub_agent_spawn",
-            "payload": {
-                "sub_agent_id": sub_agent_id,
+    request_id = _connection._new_id("spawn_req")
+    sub_agent_id = _make_sub_id(name)
+    
+    response = await _connection._request({
+        "type": "agent_spawn_request",
+        "id": _connection._new_id("msg"),
+        "ts": int(_now()),
+        "payload": {
+            "request_id": request_id,
+            "proposed_agent": {
+                "id": sub_agent_id,
                 "name": name,
                 "role": role,
+                "description": description,
+                "icon": icon,
                 "permissions": permissions or [],
                 "lifespan": lifespan,
-                "status": "online"
-            }
-        })
-        
-        sub = SubAgent(id=sub_agent_id, name=name, role=role or "Sub-Agent")
-        cls._active.append(sub)
-        cls._spawned_this_hour += 1
-        
-        if notify:
-            # Send notification (user sees but doesn't approve)
-            await _connection.send({
-                "type": "notification",
-                "payload": {
-                    "title": "Sub-Agent Spawned",
-                    "body": f"{name} started",
-                    "priority": "low",
-                    "category": "auto_spawn"
-                }
-            })
-            
+            },
+            "reason": reason
+        }
+    }, timeout=600)  # 10 min timeout for approval
+    
+    if response and response.get("payload", {}).get("decision") == "approved":
+        sub = SubAgent(
+            id=sub_agent_id,
+            name=name,
+            role=role or "Sub-Agent"
+        )
+        _agents.active[sub_agent_id] = sub
+        _agents.spawn_times.append(monotonic())
         return sub
+        
+    return None
+
+
+# Pre-rendered frames for direct spawns; only id, ts and the JSON-encoded values vary
+_SPAWN_FRAME = (
+    '{"type":"sub_agent_spawn","id":"%s","ts":%d,"payload":{"sub_agent_id":%s,'
+    '"name":%s,"role":%s,"permissions":%s,"lifespan":%s,"status":"online"}}'
+)
+_SPAWN_NOTICE_FRAME = (
+    '{"type":"notification","id":"%s","ts":%d,"payload":{"title":"Sub-Agent Spawned",'
+    '"body":%s,"priority":"low","category":"auto_spawn"}}'
+)
+
+
+async def _agents_spawn(
+    name: str,
+    role: str = None,
+    permissions: List[Dict] = None,
+    lifespan: str = "task_bound",
+    notify: bool = True
+) -> SubAgent:
+    """Spawn a sub-agent directly (only works if would_auto_approve)."""
     
-    @classmethod
-    async def kill_all(cls, reason: str = "User requested"):
-        """Terminate all active sub-agents."""
-        for sub in cls._active:
-            await sub.terminate(reason)
-        cls._active.clear()
+    if not _agents_would_auto_approve(permissions or []):
+        raise PermissionError("Cannot auto-spawn with these permissions")
         
-    @classmethod
-    def pause_spawning(cls):
-        """Stop spawning new sub-agents."""
-        # Sets a local flag; active agents continue
-        cls._spawning_paused = True
+    sub_agent_id = _make_sub_id(name)
+    
+    _connection.send_raw(_SPAWN_FRAME % (
+        _connection._new_id("msg"), _now(), _dumps_text(sub_agent_id), _dumps_text(name),
+        _dumps_text(role), _dumps_text(permissions or []), _dumps_text(lifespan)
+    ))
+    
+    sub = SubAgent(id=sub_agent_id, name=name, role=role or "Sub-Agent")
+    _agents.active[sub_agent_id] = sub
+    _agents.spawn_times.append(monotonic())
+    
+    if notify:
+        # Send notification (user sees but doesn't approve)
+        _connection.send_raw(_SPAWN_NOTICE_FRAME % (
+            _connection._new_id("msg"), _now(), _dumps_text(f"{name} started")
+        ))
+        
+    return sub
+
+
+async def _agents_kill_all(reason: str = "User requested"):
+    """Terminate all active sub-agents.
+    
+    Sub-agents whose terminate frame couldn't be queued stay in active();
+    the first such error is re-raised once every agent has been tried.
+    """
+    error = None
+    # terminate() only queues a frame, so await each in turn rather than
+    # wrapping them in tasks; one failed send shouldn't stop the rest
+    for sub in tuple(_agents.active.values()):
+        try:
+            await sub.terminate(reason)  # Drops sub from _agents.active once queued
+        except Exception as e:
+            if error is None:
+                error = e
+    if error is not None:
+        raise error
+
+
+def _agents_pause_spawning():
+    """Stop spawning new sub-agents."""
+    # Sets a local flag; active agents continue
+    _agents.paused = True
+
+
+class agents:
+    """Sub-agent management."""
+    
+    can_spawn = staticmethod(_agents_can_spawn)
+    active_count = staticmethod(_agents_active_count)
+    max_concurrent = staticmethod(_agents_max_concurrent)
+    active = staticmethod(_agents_active)
+    active_view = staticmethod(_agents_active_view)
+    would_auto_approve = staticmethod(_agents_would_auto_approve)
+    request_spawn = staticmethod(_agents_request_spawn)
+    spawn = staticmethod(_agents_spawn)
+    kill_all = staticmethod(_agents_kill_all)
+    pause_spawning = staticmethod(_agents_pause_spawning)
 
 
 # ============================================================================
 # Check-in Module
 # ============================================================================
 
-class checkin:
-    """Check-in flow for long autonomous sessions."""
+class _CheckinState:
+    """Mutable state behind the checkin namespace."""
+    __slots__ = ("session_start_ts", "last_checkin_mono")
     
-    _last_checkin: datetime = None
-    _session_start: datetime = None
-    
-    @classmethod
-    def is_required(cls) -> bool:
-        """Check if a check-in is required."""
-        cfg = get_policy()
-        
-        if cls._session_start is None:
-            cls._session_start = datetime.now()
-            cls._last_checkin = datetime.now()
-            return False
-            
-        hours_since_checkin = (datetime.now() - cls._last_checkin).total_seconds() / 3600
-        return hours_since_checkin >= cfg.check_in_hours
+    def __init__(self):
+        self.session_start_ts: Optional[int] = None  # Unix time, reported as running_since
+        self.last_checkin_mono: Optional[float] = None  # time.monotonic() of the last check-in
+
+
+_checkin = _CheckinState()
+
+
+def _checkin_is_required() -> bool:
+    """Check if a check-in is required."""
+    now = monotonic()
     
-    @classmethod
-    async def request(
-        cls,
-        summary: Dict,
-        pending_spawns: int = 0,
-        message: str = None
-    ):
-        """Send a check-in request to the user."""
-        await _connection.send({
-            "type": "checkin_request",
-            "payload": {
-                "running_since": int(cls._session_start.timestamp()),
-                "summary": summary,
-                "pending_spawns": pending_spawns,
-                "message": message
-            }
-        })
+    if _checkin.last_checkin_mono is None:
+        _checkin.session_start_ts = int(_now())
+        _checkin.last_checkin_mono = now
+        return False
         
-    @classmethod
-    async def wait_for_response(cls, timeout: float = 3600) -> Dict:
-        """Wait for user's check-in response."""
-        # Would register handler and wait for response
-        response = await _connection._request({
-            "type": "checkin_request",
-            "payload": {}
-        }, timeout=timeout)
+    return now - _checkin.last_checkin_mono >= _compiled_policy().check_in_seconds
+
+
+async def _checkin_request(
+    summary: Dict,
+    pending_spawns: int = 0,
+    message: str = None
+):
+    """Send a check-in request to the user."""
+    await _connection.send({
+        "type": "checkin_request",
+        "payload": {
+            "running_since": _checkin.session_start_ts,
+            "summary": summary,
+            "pending_spawns": pending_spawns,
+            "message": message
+        }
+    })
+
+
+async def _checkin_wait_for_response(timeout: float = 3600) -> Dict:
+    """Wait for user's check-in response."""
+    # Would register handler and wait for response
+    response = await _connection._request({
+        "type": "checkin_request",
+        "payload": {}
+    }, timeout=timeout)
+    
+    if response:
+        _checkin.last_checkin_mono = monotonic()
+        return response.get("payload", {})
         
-        if response:
-            cls._last_checkin = datetime.now()
-            return response.get("payload", {})
-            
-        return {"action": "pause"}  # Default to pause on timeout
+    return {"action": "pause"}  # Default to pause on timeout
+
+
+class checkin:
+    """Check-in flow for long autonomous sessions."""
+    
+    is_required = staticmethod(_checkin_is_required)
+    request = staticmethod(_checkin_request)
+    wait_for_response = staticmethod(_checkin_wait_for_response)
 
 
 # ============================================================================
@@ -908,6 +1470,12 @@ class checkin:
 class notify:
     """Push notifications to user's devices."""
     
+    # Pre-rendered frame for notifications without actions
+    _FRAME = (
+        '{"type":"notification","id":"%s","ts":%d,"payload":{"title":%s,"body":%s,'
+        '"priority":%s,"category":%s,"actions":[]}}'
+    )
+    
     @staticmethod
     async def send(
         title: str,
@@ -920,14 +1488,21 @@ class notify:
         
         priority: low, normal, high, critical
         """
-        await _connection.send({
+        if not actions:
+            _connection.send_raw(notify._FRAME % (
+                _connection._new_id("msg"), _now(),
+                _dumps_text(title), _dumps_text(body), _dumps_text(priority), _dumps_text(category)
+            ))
+            return
+            
+        _connection.send_batched({
             "type": "notification",
             "payload": {
                 "title": title,
                 "body": body,
                 "priority": priority,
                 "category": category,
-                "actions": actions or []
+                "actions": actions
             }
         })
 
@@ -949,6 +1524,7 @@ __all__ = [
     "checkin",
     "notify",
     "PolicyConfig",
+    "SpawnNotConnected",
     "SubAgent",
     "ProgressHandle",
 ]
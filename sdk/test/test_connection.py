@@ -0,0 +1,164 @@
+"""
+Connection tests for the Python SDK, against an in-memory relay socket.
+
+Run with: python -m pytest test/test_connection.py (from sdk/)
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import spawn  # noqa: E402
+
+
+class FakeSocket:
+    """Stands in for the relay socket; answers get_policy requests."""
+
+    def __init__(self):
+        self.sent = []
+        self.inbox = asyncio.Queue()
+        self.closed = False
+
+    async def send(self, frame):
+        await asyncio.sleep(0)
+        if self.closed:
+            raise spawn.websockets.ConnectionClosed(None, None)
+        self.sent.append(frame)
+        data = json.loads(frame)
+        if data["type"] == "get_policy":
+            await self.inbox.put(json.dumps({"type": "policy", "payload": {"request_id": data["id"]}}))
+
+    def close(self):
+        """Simulate the relay closing the socket."""
+        self.closed = True
+        self.inbox.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.inbox.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+
+def run_with_sockets(test):
+    """Run test(conn, sockets) with connect() handing out FakeSockets."""
+    sockets = []
+
+    async def fake_connect(url, extra_headers=None):
+        sockets.append(FakeSocket())
+        return sockets[-1]
+
+    real_connect = spawn.websockets.connect
+    spawn.websockets.connect = fake_connect
+    try:
+        conn = spawn.SpawnConnection("token")
+        return asyncio.run(test(conn, sockets))
+    finally:
+        spawn.websockets.connect = real_connect
+
+
+def sent_types(socket):
+    return [json.loads(frame)["type"] for frame in socket.sent]
+
+
+def test_close_then_reconnect_sends_on_new_socket():
+    async def test(conn, sockets):
+        await conn.connect()
+        sockets[0].close()
+        await asyncio.sleep(0.01)
+        assert not conn._connected
+
+        await conn.connect()
+        await conn.send({"type": "text", "payload": {"content": "a"}})
+        await conn.send({"type": "text", "payload": {"content": "b"}})
+        await asyncio.sleep(0.01)
+
+        assert conn._connected
+        assert conn._unsent == []
+        assert sent_types(sockets[1]) == ["get_policy", "text", "text"]
+
+    run_with_sockets(test)
+
+
+def test_frames_queued_while_disconnected_are_sent_after_reconnect():
+    async def test(conn, sockets):
+        await conn.connect()
+        sockets[0].close()
+        await asyncio.sleep(0.01)
+
+        await conn.send({"type": "text", "payload": {"content": "held"}})
+        await asyncio.sleep(0.01)
+        await conn.connect()
+        await asyncio.sleep(0.01)
+
+        assert "text" in sent_types(sockets[1])
+
+    run_with_sockets(test)
+
+
+def request(conn, request_id, timeout):
+    return conn._request({"type": "x", "id": request_id, "payload": {}}, timeout=timeout)
+
+
+def test_short_deadline_after_long_one_times_out_first():
+    async def test():
+        conn = spawn.SpawnConnection("token")
+        long = asyncio.ensure_future(request(conn, "long", 10))
+        await asyncio.sleep(0)
+        short = asyncio.ensure_future(request(conn, "short", 0.01))
+        assert await asyncio.wait_for(short, 1) is None
+        assert not long.done()
+        conn._pending_responses["long"].set_result({"ok": True})
+        assert await long == {"ok": True}
+        assert conn._pending_responses == {} and conn._deadlines == {}
+
+    asyncio.run(test())
+
+
+def test_timeout_none_waits_for_response():
+    async def test():
+        conn = spawn.SpawnConnection("token")
+        task = asyncio.ensure_future(request(conn, "r", None))
+        await asyncio.sleep(0.05)
+        assert not task.done()
+        assert "r" not in conn._deadlines
+        conn._pending_responses["r"].set_result({"ok": True})
+        assert await task == {"ok": True}
+        assert conn._pending_responses == {}
+
+    asyncio.run(test())
+
+
+def test_late_response_after_timeout_is_ignored():
+    async def test(conn, sockets):
+        await conn.connect()
+        assert await request(conn, "late", 0.01) is None
+        await sockets[0].inbox.put(json.dumps({"type": "resp", "payload": {"request_id": "late"}}))
+
+        # The message loop survives and still answers later requests
+        task = asyncio.ensure_future(request(conn, "next", 1))
+        await asyncio.sleep(0.01)
+        await sockets[0].inbox.put(json.dumps({"type": "resp", "payload": {"request_id": "next"}}))
+        assert (await task)["payload"]["request_id"] == "next"
+        assert conn._connected
+
+    run_with_sockets(test)
+
+
+def test_bad_policy_update_keeps_message_loop_running():
+    async def test(conn, sockets):
+        await conn.connect()
+        await sockets[0].inbox.put(json.dumps({"type": "policy_update", "payload": {"auto_spawn_mode": None}}))
+        await sockets[0].inbox.put(json.dumps({"type": "policy_update", "payload": {"check_in_hours": 1}}))
+        await asyncio.sleep(0.01)
+        assert conn._connected
+        assert conn.policy.auto_spawn_mode == "off"
+        assert conn.policy.check_in_hours == 1
+
+    run_with_sockets(test)
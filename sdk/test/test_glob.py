@@ -0,0 +1,54 @@
+"""
+Path glob tests for the Python SDK policy checks.
+
+Run with: python -m pytest test/test_glob.py (from sdk/)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from spawn import PolicyConfig, _CompiledPolicy, _compile_union  # noqa: E402
+
+
+def matches(pattern: str, path: str) -> bool:
+    return _compile_union([pattern]).fullmatch(path) is not None
+
+
+def test_wildcards():
+    assert matches("/src/**/*.py", "/src/a/b/c.py")
+    assert matches("/src/**/*.py", "/src/c.py")
+    assert not matches("/src/*.py", "/src/a/c.py")
+    assert matches("/tmp/?.txt", "/tmp/a.txt")
+
+
+def test_character_class():
+    assert matches("/src/*.[ch]", "/src/a.c")
+    assert matches("/src/*.[ch]", "/src/a.h")
+    assert not matches("/src/*.[ch]", "/src/a.o")
+    assert matches("/logs/[0-9]*.log", "/logs/2024.log")
+
+
+def test_negated_character_class():
+    assert matches("/src/*.[!o]", "/src/a.c")
+    assert not matches("/src/*.[!o]", "/src/a.o")
+
+
+def test_unclosed_or_empty_bracket_is_literal():
+    assert matches("/a[", "/a[")
+    assert matches("/a[]", "/a[]")
+    assert matches("/a[!]", "/a[!]")
+
+
+def test_invalid_range_matches_nothing():
+    assert not matches("/a[z-a]", "/ab")
+    union = _CompiledPolicy(PolicyConfig(forbidden_paths=["/a[z-a]", "/b/**"])).forbidden_union
+    assert union.fullmatch("/b/c")
+
+
+def test_forbidden_path_with_character_class():
+    union = _CompiledPolicy(PolicyConfig(forbidden_paths=["/home/u/.ssh/id_[rd]sa*"])).forbidden_union
+    assert union.fullmatch("/home/u/.ssh/id_rsa.pub")
+    assert union.fullmatch("/home/u/.ssh/id_dsa")
+    assert not union.fullmatch("/home/u/.ssh/id_ed25519")
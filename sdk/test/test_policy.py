@@ -0,0 +1,54 @@
+"""
+Policy update tests for the Python SDK.
+
+Run with: python -m pytest test/test_policy.py (from sdk/)
+"""
+
+import dataclasses
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import spawn  # noqa: E402
+
+
+def test_invalid_values_are_skipped():
+    conn = spawn.SpawnConnection("token")
+    conn._update_policy({
+        "auto_spawn_mode": None,
+        "permissions_ask": ["files.write", None],
+        "max_concurrent_sub_agents": True,
+        "check_in_hours": 2,
+    })
+    assert conn.policy.auto_spawn_mode == "off"
+    assert conn.policy.permissions_ask == spawn.PolicyConfig().permissions_ask
+    assert conn.policy.max_concurrent_sub_agents == 5
+    assert conn.policy.check_in_hours == 2
+    assert conn._policy_version == 1
+
+
+def test_valid_update_replaces_policy_and_lookups():
+    conn = spawn.SpawnConnection("token")
+    old = conn.policy
+    conn._update_policy({"auto_spawn_mode": "trusted", "permissions_forbidden": ["system.shell"]})
+    assert old.auto_spawn_mode == "off"
+    assert conn.policy.permissions_forbidden == ("system.shell",)
+    assert conn._compiled.permissions_forbidden == frozenset({"system.shell"})
+    assert conn._compiled.auto_approve([{"scope": "files.delete"}])
+
+
+def test_list_settings_are_immutable():
+    cfg = spawn.PolicyConfig(forbidden_paths=["/a/**"])
+    assert cfg.forbidden_paths == ("/a/**",)
+    try:
+        cfg.forbidden_paths.append("/b/**")
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("expected AttributeError")
+
+
+def test_policy_serializes_to_json():
+    json.dumps(dataclasses.asdict(spawn.PolicyConfig()))
@@ -0,0 +1,78 @@
+"""
+ProgressHandle step tests for the Python SDK.
+
+Run with: python -m pytest test/test_progress.py (from sdk/)
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import spawn  # noqa: E402
+
+STEPS = ["fetch", "build", "test"]
+
+
+def step_statuses(updates):
+    """Apply updates to a fresh handle; return the statuses from each frame."""
+    async def run():
+        conn = spawn.SpawnConnection("token")
+        previous, spawn._connection = spawn._connection, conn
+        try:
+            handle = spawn.ProgressHandle(id="p", title="Build", steps=list(STEPS))
+            for update in updates:
+                await handle.update(**update)
+            frames = []
+            while not conn._send_queue.empty():
+                frames.append(json.loads(conn._send_queue.get_nowait()))
+            return [[s["status"] for s in f["payload"]["steps"]] for f in frames]
+        finally:
+            spawn._connection = previous
+
+    return asyncio.run(run())
+
+
+def test_steps_advance():
+    assert step_statuses([{"step": 0}, {"step": 2, "step_status": "failed"}]) == [
+        ["running", "pending", "pending"],
+        ["complete", "complete", "failed"],
+    ]
+
+
+def test_step_past_the_end_marks_all_complete():
+    assert step_statuses([{"step": 1}, {"step": 3}, {"step": 0}]) == [
+        ["complete", "running", "pending"],
+        ["complete", "complete", "complete"],
+        ["running", "pending", "pending"],
+    ]
+
+
+def test_negative_step_marks_all_pending():
+    assert step_statuses([{"step": 2}, {"step": -1}, {"step": 1}]) == [
+        ["complete", "complete", "running"],
+        ["pending", "pending", "pending"],
+        ["complete", "running", "pending"],
+    ]
+
+
+def test_invalid_step_status_index_leaves_state_unchanged():
+    async def run():
+        conn = spawn.SpawnConnection("token")
+        previous, spawn._connection = spawn._connection, conn
+        try:
+            handle = spawn.ProgressHandle(id="p", title="Build", steps=list(STEPS))
+            await handle.update(step=1)
+            try:
+                await handle.update(step=5, step_status="failed")
+            except IndexError:
+                pass
+            else:
+                raise AssertionError("expected IndexError")
+            return list(handle._step_states), handle._step
+        finally:
+            spawn._connection = previous
+
+    assert asyncio.run(run()) == (["complete", "running", "pending"], 1)